@@ -1,20 +1,40 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import os
 from typing import Dict, Any
 
 from datetime import datetime
 import math
-import heapq
-from typing import List, Tuple, Optional, Set, DefaultDict
-from collections import defaultdict
+from typing import List, Tuple, Optional, NamedTuple
 import time
 import hashlib
+import functools
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
 import requests
+from requests.adapters import HTTPAdapter
+import orjson
+import numpy as np
+from diskcache import Cache
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as sp_dijkstra
+except ImportError:  # SciPy is optional; _shortest_path falls back to A* (Numba or pure Python)
+    csr_matrix = sp_dijkstra = None
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; only used when SciPy is unavailable
+    njit = None
 
 app = Flask(__name__)
 CORS(app)
 
+logger = logging.getLogger(__name__)
+
 # ---- Helper Functions (must be defined before route handlers that use them) ----
 # Overpass API endpoints - try multiple in case of timeout
 OverpassURLs = [
@@ -29,48 +49,196 @@ OverpassURL = OverpassURLs[0]  # Default to first one
 _OVERPASS_CACHE: Dict[str, Tuple[float, dict]] = {}
 _OVERPASS_CACHE_TTL_S = 300.0  # 5 minutes
 
+# Persistent second-level cache so repeated areas survive restarts and skip the network.
+_OVERPASS_DISK_CACHE = Cache(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.overpass_cache'))
+_OVERPASS_DISK_CACHE_TTL_S = 86400.0  # 24 hours
+
+# Bbox coordinates are snapped outward to this many decimals (~11 m) so that
+# near-identical viewport requests produce the same query text and cache key.
+_BBOX_SNAP_DECIMALS = 4
+
+# /api/navigation rounds origin/dest to this many decimals (~11 m) before routing,
+# so repeat requests for the same trip hit the _route_response LRU cache.
+_ROUTE_CACHE_DECIMALS = 4
+# Cached routes hold the encoded response (~1-2 MB for a dense area) and expire with the
+# Overpass data they were built from
+_ROUTE_CACHE_SIZE = 128
+_ROUTE_CACHE_TTL_S = _OVERPASS_DISK_CACHE_TTL_S
+
+# Number of mirrors queried concurrently; the rest are only tried if all of these fail.
+_OVERPASS_RACE_WIDTH = 2
+
+# Responses are read in chunks of this size so a race loser notices the abort between reads.
+_OVERPASS_CHUNK_BYTES = 64 * 1024
+
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='overpass-prefetch')
+
+# Shared keep-alive session: back-to-back queries (e.g. footpaths + highways) reuse the
+# TCP/TLS connection instead of paying a fresh handshake per call. One pooled connection
+# per racing request (up to 4 concurrent fetches x _OVERPASS_RACE_WIDTH) so concurrent
+# races don't discard connections.
+_OVERPASS_SESSION = requests.Session()
+_OVERPASS_SESSION.mount('https://', HTTPAdapter(pool_connections=len(OverpassURLs), pool_maxsize=4 * _OVERPASS_RACE_WIDTH, max_retries=0))
+_OVERPASS_SESSION.headers.update({'User-Agent': 'RailNav/1.0', 'Accept-Encoding': 'gzip, deflate'})
+
+# Overpass QL templates; filled with str.format_map so identical bboxes always yield
+# byte-identical query text (and therefore the same cache key).
+_PEDESTRIAN_CATALOG_QUERY = """
+    [out:json][timeout:180];
+    (
+      way["highway"="footway"]["footway"="sidewalk"]({bbox});
+      way["highway"="footway"]["footway"="crossing"]({bbox});
+      way["highway"="steps"]({bbox});
+      way["highway"="pedestrian"]({bbox});
+      way["highway"="footway"]({bbox});
+      way["highway"="path"]({bbox});
+    );
+    (._;>;);
+    out body;
+    """
+
+_PEDESTRIAN_WAYS_QUERY = """
+    [out:json][timeout:180];
+    (
+      way
+        ["highway"~"^(footway|path|pedestrian|steps)$"]
+        ({bbox});
+    );
+    (._;>;);
+    out body;
+    """
+
+_HIGHWAYS_QUERY = """
+    [out:json][timeout:180];
+    (
+      way
+        ["highway"~"^(residential|service|tertiary|secondary|primary|trunk|motorway|unclassified)$"]
+        ({bbox});
+    );
+    (._;>;);
+    out body;
+    """
+
+# Road types accepted as hybrid connectors (mirrors the _HIGHWAYS_QUERY filter)
+_HIGHWAY_TYPES = frozenset({
+    'residential', 'service', 'tertiary', 'secondary', 'primary', 'trunk', 'motorway', 'unclassified',
+})
+
+# highway tag -> navigation category for ways that need no further tag inspection;
+# footway and path are sub-cased on their footway/informal tags in _fetch_pedestrian_ways
+_PED_CATEGORY = {
+    'steps': 'steps',
+    'pedestrian': 'pedestrian_street',
+}
+
+class _OverpassIncompleteError(Exception):
+    """Overpass answered 200 but flagged the result as incomplete with a 'remark'."""
+
 def _fetch_overpass_data(query: str, timeout: int = 180) -> dict:
     """
     Fetch data from Overpass API with retry logic and multiple endpoint fallback.
-    Tries each endpoint in order until one succeeds.
+    Races the first _OVERPASS_RACE_WIDTH endpoints and takes the first success;
+    the remaining endpoints are tried in order only if all of those fail.
     """
     now = time.time()
     cache_key = hashlib.sha1(query.encode('utf-8')).hexdigest()
     cached = _OVERPASS_CACHE.get(cache_key)
     if cached and (now - cached[0]) < _OVERPASS_CACHE_TTL_S:
         return cached[1]
+    data = _OVERPASS_DISK_CACHE.get(cache_key)
+    if data is not None:
+        _OVERPASS_CACHE[cache_key] = (now, data)
+        return data
 
     last_error: Exception | None = None
-    
-    for url in OverpassURLs:
-        # Try each endpoint twice (often succeeds on a second try).
-        for attempt in range(2):
-            try:
-                print(f"Trying Overpass API: {url} (attempt {attempt + 1}/2)")
-                resp = requests.post(url, data={'data': query}, timeout=timeout)
-                resp.raise_for_status()
-                data = resp.json()
+
+    # Each race gets its own short-lived executor, shut down without waiting: a loser that is
+    # still blocked on a slow mirror never holds a worker that later requests need. The abort
+    # event makes it stop at its next chunk read instead of downloading the rest.
+    abort = threading.Event()
+    race = ThreadPoolExecutor(max_workers=_OVERPASS_RACE_WIDTH, thread_name_prefix='overpass-race')
+    try:
+        pending = {race.submit(_fetch_from_endpoint, url, query, timeout, abort) for url in OverpassURLs[:_OVERPASS_RACE_WIDTH]}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    data = fut.result()
+                except Exception as e:
+                    last_error = e
+                    continue
                 _OVERPASS_CACHE[cache_key] = (time.time(), data)
-                print(f"✅ Successfully fetched data from {url}")
+                _OVERPASS_DISK_CACHE.set(cache_key, data, expire=_OVERPASS_DISK_CACHE_TTL_S)
                 return data
-            except requests.exceptions.Timeout as e:
-                print(f"⏱️ Timeout error with {url}: {e}")
-                last_error = e
-                # small backoff before retrying same endpoint
-                time.sleep(0.4 * (attempt + 1))
-                continue
-            except requests.exceptions.RequestException as e:
-                print(f"❌ Request error with {url}: {e}")
-                last_error = e
-                break
-            except Exception as e:
-                print(f"❌ Unexpected error with {url}: {e}")
-                last_error = e
-                break
+    finally:
+        abort.set()
+        race.shutdown(wait=False, cancel_futures=True)
+
+    for url in OverpassURLs[_OVERPASS_RACE_WIDTH:]:
+        try:
+            data = _fetch_from_endpoint(url, query, timeout)
+        except Exception as e:
+            last_error = e
+            continue
+        _OVERPASS_CACHE[cache_key] = (time.time(), data)
+        _OVERPASS_DISK_CACHE.set(cache_key, data, expire=_OVERPASS_DISK_CACHE_TTL_S)
+        return data
     
     # If all endpoints failed, raise the last error
     raise Exception(f"All Overpass API endpoints failed. Last error: {last_error}")
 
+class _OverpassAbortedError(Exception):
+    """Another mirror won the race; this request was abandoned."""
+
+def _fetch_from_endpoint(url: str, query: str, timeout: int, abort: Optional[threading.Event] = None) -> dict:
+    """
+    Query a single Overpass endpoint, retrying once on timeout. Raises the last error on failure.
+    When abort is set the request is dropped at its next chunk read and no retry is made.
+    """
+    last_error: Exception | None = None
+    # Try each endpoint twice (often succeeds on a second try).
+    for attempt in range(2):
+        if abort is not None and abort.is_set():
+            raise _OverpassAbortedError(url)
+        try:
+            logger.debug("Trying Overpass API: %s (attempt %d/2)", url, attempt + 1)
+            with _OVERPASS_SESSION.post(url, data={'data': query}, timeout=timeout, stream=True) as resp:
+                resp.raise_for_status()
+                chunks = []
+                for chunk in resp.iter_content(_OVERPASS_CHUNK_BYTES):
+                    if abort is not None and abort.is_set():
+                        raise _OverpassAbortedError(url)
+                    chunks.append(chunk)
+            data = orjson.loads(b''.join(chunks))
+            if data.get('remark'):
+                # HTTP 200 whose 'remark' reports a server-side runtime error (timeout, out of
+                # memory): 'elements' is partial or empty, so it must not be used or cached
+                raise _OverpassIncompleteError(f"Incomplete Overpass result from {url}: {data['remark']}")
+            logger.debug("Fetched Overpass data from %s", url)
+            return data
+        except requests.exceptions.Timeout as e:
+            logger.warning("Timeout with %s: %s", url, e)
+            last_error = e
+            # small backoff before retrying same endpoint
+            time.sleep(0.4 * (attempt + 1))
+            continue
+        except _OverpassIncompleteError as e:
+            logger.warning("%s", e)
+            last_error = e
+            break
+        except _OverpassAbortedError:
+            logger.debug("Abandoned Overpass request to %s: another mirror answered first", url)
+            raise
+        except requests.exceptions.RequestException as e:
+            logger.warning("Request error with %s: %s", url, e)
+            last_error = e
+            break
+        except Exception as e:
+            logger.warning("Unexpected error with %s: %s", url, e)
+            last_error = e
+            break
+    raise last_error
+
 def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two lat/lng points in meters using Haversine formula."""
     R = 6371000.0
@@ -81,12 +249,81 @@ def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+def _haversine_vec(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Vectorized Haversine: element-wise distances in meters between coordinate arrays."""
+    R = 6371000.0
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(dphi/2.0)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda/2.0)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+# Meters per degree of latitude (same constant as _bbox_from_point_radius)
+_M_PER_DEG_LAT = 111320.0
+
+def _equirect_vec(lat1, lon1, lat2, lon2, m_per_deg_lon: float) -> np.ndarray:
+    """
+    Equirectangular distance in meters with a fixed longitude scale. Within a routing bbox of a
+    few km the error vs Haversine is far below OSM precision, at a fraction of the trig cost.
+    """
+    return np.hypot((lat2 - lat1) * _M_PER_DEG_LAT, (lon2 - lon1) * m_per_deg_lon)
+
+class _NodeTable(NamedTuple):
+    """Struct-of-arrays view of OSM nodes: row i holds ids[i], lats[i], lons[i]."""
+    ids: np.ndarray
+    lats: np.ndarray
+    lons: np.ndarray
+    index: Dict[int, int]  # OSM node id -> row
+    m_per_deg_lon: float   # equirectangular longitude scale at the table's mean latitude
+
+def _node_table(nodes: Dict[int, Tuple[float, float]]) -> _NodeTable:
+    """Build the coordinate table once so edge weights can be computed per way in bulk."""
+    n = len(nodes)
+    ids = np.fromiter(nodes.keys(), dtype=np.int64, count=n)
+    coords = np.array(list(nodes.values()), dtype=np.float64).reshape(n, 2)
+    index = {nid: i for i, nid in enumerate(nodes)}
+    lats, lons = coords[:, 0].copy(), coords[:, 1].copy()
+    mid_lat = float(lats.mean()) if n else 0.0
+    return _NodeTable(ids, lats, lons, index, _M_PER_DEG_LAT * math.cos(math.radians(mid_lat)))
+
+def _extend_table(table: _NodeTable, nodes: Dict[int, Tuple[float, float]]) -> _NodeTable:
+    """Append the nodes not already in table; existing rows keep their indices."""
+    extra = {nid: ll for nid, ll in nodes.items() if nid not in table.index}
+    added = _node_table(extra)
+    offset = len(table.ids)
+    index = dict(table.index)
+    index.update((nid, offset + i) for nid, i in added.index.items())
+    lats = np.concatenate([table.lats, added.lats])
+    mid_lat = float(lats.mean()) if len(lats) else 0.0
+    return _NodeTable(
+        np.concatenate([table.ids, added.ids]), lats, np.concatenate([table.lons, added.lons]),
+        index, _M_PER_DEG_LAT * math.cos(math.radians(mid_lat)),
+    )
+
 def _bbox_from_point_radius(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
     """Calculate bounding box around a point with given radius in meters."""
     dlat = (radius_m / 111320.0)
     dlng = (radius_m / (111320.0 * math.cos(math.radians(lat))))
     return (lat - dlat, lng - dlng, lat + dlat, lng + dlng)
 
+def _snap_bbox(south: float, west: float, north: float, east: float) -> Tuple[float, float, float, float]:
+    """Round a bbox outward to _BBOX_SNAP_DECIMALS so it still covers the requested area."""
+    f = 10 ** _BBOX_SNAP_DECIMALS
+    return (math.floor(south * f) / f, math.floor(west * f) / f, math.ceil(north * f) / f, math.ceil(east * f) / f)
+
+def _bbox_params(south: float, west: float, north: float, east: float) -> Dict[str, str]:
+    """Snapped bbox as format_map parameters for the Overpass query templates."""
+    south, west, north, east = _snap_bbox(south, west, north, east)
+    return {'bbox': f"{south},{west},{north},{east}"}
+
+def _json_bytes(payload: Dict[str, Any]) -> bytes:
+    """Serialize payload with orjson (NumPy arrays included) instead of Flask's stdlib json."""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def _json_response(payload: Dict[str, Any], status: int = 200) -> Response:
+    return Response(_json_bytes(payload), status=status, mimetype='application/json')
+
 # ---- API: Health check ----
 @app.route('/')
 def home():
@@ -102,11 +339,16 @@ def navigation():
       - origin: "lat,lng" (required)
       - dest: "lat,lng" (required)
       - radius_m: search radius around midpoint in meters (optional, default 600)
+      - fresh: "1" to bypass the route cache (optional)
+      - compact: "1" to return route/network coordinates as [lat, lng] pairs instead of
+        {lat, lng} objects (optional)
     """
     origin_str = request.args.get('origin')
     dest_str = request.args.get('dest')
     # Increase default radius to 2000m (2km) for better coverage
     radius_m = float(request.args.get('radius_m', '2000'))
+    fresh = request.args.get('fresh', '0') == '1'
+    compact = request.args.get('compact', '0') == '1'
 
     if not origin_str or not dest_str:
         return jsonify({'status': 'error', 'message': 'origin and dest query params are required: origin=lat,lng&dest=lat,lng'}), 400
@@ -119,6 +361,38 @@ def navigation():
     except Exception:
         return jsonify({'status': 'error', 'message': 'Invalid origin or dest format. Use origin=lat,lng&dest=lat,lng'}), 400
 
+    origin_q = (round(origin[0], _ROUTE_CACHE_DECIMALS), round(origin[1], _ROUTE_CACHE_DECIMALS))
+    dest_q = (round(dest[0], _ROUTE_CACHE_DECIMALS), round(dest[1], _ROUTE_CACHE_DECIMALS))
+    try:
+        if fresh:
+            body, status = _route_response.__wrapped__(origin_q, dest_q, radius_m, compact, 0)
+        else:
+            # Entries are keyed by TTL window, so none is served past _ROUTE_CACHE_TTL_S
+            ttl_window = int(time.time() // _ROUTE_CACHE_TTL_S)
+            body, status = _route_response(origin_q, dest_q, radius_m, compact, ttl_window)
+        return Response(body, status=status, mimetype='application/json')
+    except Exception as exc:
+        return jsonify({'status': 'error', 'message': str(exc)}), 500
+
+@functools.lru_cache(maxsize=_ROUTE_CACHE_SIZE)
+def _route_response(origin: Tuple[float, float], dest: Tuple[float, float], radius_m: float, compact: bool, ttl_window: int) -> Tuple[bytes, int]:
+    """
+    Memoized (JSON body, HTTP status) of _compute_route. Only the encoded bytes are kept:
+    the payload's per-point dicts take several times more memory than their JSON.
+    ttl_window only partitions the cache by time; callers must pass rounded coordinates.
+    """
+    payload, status = _compute_route(origin, dest, radius_m, compact)
+    return _json_bytes(payload), status
+
+def _compute_route(origin: Tuple[float, float], dest: Tuple[float, float], radius_m: float, compact: bool = False) -> Tuple[Dict[str, Any], int]:
+    """
+    Fetch footpaths around origin/dest, build the routing graph(s) and route between them.
+    Returns (payload, HTTP status); the payload may hold NumPy arrays, so serialize it with
+    _json_bytes/_json_response.
+    """
+    # Set once the hybrid graph can no longer be used, so a background build can skip its work
+    hybrid_abandoned = threading.Event()
+    highways_future: Optional[Future] = None
     try:
         # Compute a bbox around mid-point to limit Overpass query size
         # Also expand bbox to cover both origin and dest with buffer
@@ -132,130 +406,123 @@ def navigation():
         
         south, west, north, east = _bbox_from_point_radius(mid_lat, mid_lng, effective_radius)
 
-        osm_nodes, ways = _fetch_pedestrian_ways(south, west, north, east)
+        # Highways are only needed if the pedestrian-only route fails, but fetching them
+        # concurrently hides their network latency behind the pedestrian fetch + routing.
+        highways_future = _PREFETCH_POOL.submit(_fetch_highways_unless, hybrid_abandoned, south, west, north, east)
+        table, ways = _fetch_pedestrian_ways(south, west, north, east)
         if not ways:
-            return jsonify({
+            return {
                 'status': 'error', 
                 'message': f'No pedestrian footpaths found in area (searched {effective_radius:.0f}m radius). Try increasing radius_m parameter.',
                 'debug': {
                     'bbox': {'south': south, 'west': west, 'north': north, 'east': east},
                     'radius_m': effective_radius
                 }
-            }), 404
+            }, 404
 
-        graph, edge_types = _build_graph(osm_nodes, ways)
+        # Build the hybrid graph in the background while the pedestrian graph is built and routed.
+        hybrid_future = _chain_hybrid(highways_future, table, ways, hybrid_abandoned)
+
+        graph, edge_types = _build_graph(table, ways)
         
-        if not graph:
-            return jsonify({
+        if graph.size == 0:
+            return {
                 'status': 'error',
                 'message': 'Failed to build routing graph from footpaths',
-                'debug': {'ways_count': len(ways), 'nodes_count': len(osm_nodes)}
-            }), 404
+                'debug': {'ways_count': len(ways), 'nodes_count': len(table.ids)}
+            }, 404
 
-        # Try with increasing search distances
-        max_search_distances = [200.0, 500.0, 1000.0]  # Try 200m, then 500m, then 1000m
-        origin_node = None
-        dest_node = None
-        
-        for max_dist in max_search_distances:
-            if origin_node is None:
-                origin_node = _nearest_node(origin, osm_nodes, graph, max_dist)
-            if dest_node is None:
-                dest_node = _nearest_node(dest, osm_nodes, graph, max_dist)
-            if origin_node and dest_node:
-                break
+        # Search out to 1000m. Widening 200m -> 500m -> 1000m would pick the same
+        # (globally nearest) node, so one scan per point at the widest radius suffices.
+        locator = _node_locator(graph)
+        origin_node = _nearest_node(origin, locator, 1000.0)
+        dest_node = _nearest_node(dest, locator, 1000.0)
         
         if origin_node is None:
-            return jsonify({
+            return {
                 'status': 'error', 
                 'message': f'Could not find footpath within 1km of origin ({origin[0]:.6f}, {origin[1]:.6f}). The area may not have mapped footpaths.',
                 'debug': {
                     'origin': origin,
                     'ways_found': len(ways),
-                    'nodes_found': len(osm_nodes),
+                    'nodes_found': len(table.ids),
                     'suggestion': 'Try a different starting point or increase radius_m parameter'
                 }
-            }), 404
+            }, 404
             
         if dest_node is None:
-            return jsonify({
+            return {
                 'status': 'error', 
                 'message': f'Could not find footpath within 1km of destination ({dest[0]:.6f}, {dest[1]:.6f}). The area may not have mapped footpaths.',
                 'debug': {
                     'dest': dest,
                     'ways_found': len(ways),
-                    'nodes_found': len(osm_nodes),
+                    'nodes_found': len(table.ids),
                     'suggestion': 'Try a different destination or increase radius_m parameter'
                 }
-            }), 404
+            }, 404
 
         node_path = _shortest_path(graph, origin_node, dest_node)
         use_highways = False
+        if node_path:
+            hybrid_abandoned.set()
+            highways_future.cancel()
         
         # If no pure pedestrian route found, try hybrid routing with highways as connectors
         if not node_path:
-            # Fetch highways to use as connectors
-            highway_nodes, highway_ways = _fetch_highways(south, west, north, east)
+            hybrid = hybrid_future.result()
             
-            if highway_ways:
-                # Merge pedestrian and highway nodes
-                all_nodes = {**osm_nodes, **highway_nodes}
-                
-                # Build hybrid graph with both pedestrian paths and highways
-                # Highways get higher weight (penalty) to prefer pedestrian paths
-                hybrid_graph, hybrid_edge_types = _build_hybrid_graph(
-                    all_nodes, ways, highway_ways, 
-                    pedestrian_weight=1.0, highway_weight=3.0  # Highways cost 3x more
-                )
+            if hybrid is not None:
+                hybrid_graph, hybrid_edge_types, hybrid_locator = hybrid
                 
                 # Find nearest nodes in hybrid graph
-                hybrid_origin_node = _nearest_node(origin, all_nodes, hybrid_graph, 1000.0)
-                hybrid_dest_node = _nearest_node(dest, all_nodes, hybrid_graph, 1000.0)
+                hybrid_origin_node = _nearest_node(origin, hybrid_locator, 1000.0)
+                hybrid_dest_node = _nearest_node(dest, hybrid_locator, 1000.0)
                 
-                if hybrid_origin_node and hybrid_dest_node:
+                if hybrid_origin_node is not None and hybrid_dest_node is not None:
                     node_path = _shortest_path(hybrid_graph, hybrid_origin_node, hybrid_dest_node)
                     if node_path:
                         use_highways = True
                         edge_types = hybrid_edge_types
-                        osm_nodes = all_nodes  # Use merged nodes
-                        print(f"✅ Hybrid route found using highways as connectors")
+                        table = hybrid_graph.table  # Use merged nodes
+                        logger.debug("Hybrid route found using highways as connectors")
         
         if not node_path:
-            return jsonify({
+            return {
                 'status': 'error', 
                 'message': 'No route found between points. Even with highway connectors, no path exists.',
                 'debug': {
-                    'origin_node': origin_node,
-                    'dest_node': dest_node,
-                    'graph_size': len(graph),
+                    'origin_node': int(table.ids[origin_node]),
+                    'dest_node': int(table.ids[dest_node]),
+                    'graph_size': graph.size,
                     'ways_in_area': len(ways),
                     'tried_hybrid': True
                 }
-            }), 404
+            }, 404
 
-        coords = [{'lat': osm_nodes[nid][0], 'lng': osm_nodes[nid][1]} for nid in node_path]
-        colored_segments = _segments_with_types(node_path, osm_nodes, edge_types)
-        network_geoms = _network_geometries(osm_nodes, ways)
+        path_lats, path_lngs, categories = _path_profile(node_path, table, edge_types)
+        lat_list, lng_list = path_lats.tolist(), path_lngs.tolist()
+        if compact:
+            coords = np.column_stack((path_lats, path_lngs))
+        else:
+            coords = [{'lat': lat, 'lng': lng} for lat, lng in zip(lat_list, lng_list)]
+        colored_segments = _segments_with_types(lat_list, lng_list, categories)
+        network_geoms = _network_geometries(table, ways, compact)
 
-        # Calculate statistics
-        total_distance = _polyline_length(coords)
-        pedestrian_distance = 0.0
-        highway_distance = 0.0
-        
-        for seg in colored_segments:
-            seg_dist = _haversine_m(seg['from']['lat'], seg['from']['lng'], seg['to']['lat'], seg['to']['lng'])
-            if seg.get('category') == 'highway' or seg.get('highway') == 'highway':
-                highway_distance += seg_dist
-            else:
-                pedestrian_distance += seg_dist
+        # Calculate statistics: all segment lengths in one pass, split by category
+        seg_m = _haversine_vec(path_lats[:-1], path_lngs[:-1], path_lats[1:], path_lngs[1:])
+        is_highway = np.fromiter((c == 'highway' for c in categories), dtype=bool, count=len(categories))
+        total_distance = float(seg_m.sum())
+        highway_distance = float(seg_m[is_highway].sum())
+        pedestrian_distance = float(seg_m[~is_highway].sum())
         
-        return jsonify({
+        return {
             'status': 'success',
             'route': coords,
             'route_colored': colored_segments,
             'network': network_geoms,
             'meta': {
-                'nodes': len(osm_nodes),
+                'nodes': len(table.ids),
                 'ways': len(ways),
                 'distance_m': total_distance,
                 'pedestrian_distance_m': pedestrian_distance,
@@ -263,9 +530,68 @@ def navigation():
                 'uses_highways': use_highways,
                 'routing_mode': 'hybrid' if use_highways else 'pedestrian_only'
             }
-        })
-    except Exception as exc:
-        return jsonify({'status': 'error', 'message': str(exc)}), 500
+        }, 200
+    finally:
+        hybrid_abandoned.set()
+        if highways_future is not None:
+            highways_future.cancel()
+
+def _fetch_highways_unless(abandoned: threading.Event, south: float, west: float, north: float, east: float):
+    """_fetch_highways for the speculative prefetch; returns None if the route no longer needs it."""
+    if abandoned.is_set():
+        return None
+    return _fetch_highways(south, west, north, east)
+
+def _chain_hybrid(highways_future: Future, table: _NodeTable, ways: List[Dict[str, Any]], abandoned: threading.Event) -> Future:
+    """
+    Return a future of _prepare_hybrid's result. The build is only submitted to _PREFETCH_POOL
+    once the highway fetch has finished, so no worker sits blocked waiting on it. Resolves to
+    None without building when the fetch was skipped or cancelled, or the route was abandoned.
+    """
+    hybrid_future: Future = Future()
+
+    def build():
+        try:
+            hybrid_future.set_result(_prepare_hybrid(highways_future.result(), table, ways, abandoned))
+        except Exception as e:
+            hybrid_future.set_exception(e)
+
+    def on_highways(fut: Future):
+        if fut.cancelled() or abandoned.is_set():
+            hybrid_future.set_result(None)
+            return
+        try:
+            _PREFETCH_POOL.submit(build)
+        except RuntimeError as e:  # pool shut down at interpreter exit
+            hybrid_future.set_exception(e)
+
+    highways_future.add_done_callback(on_highways)
+    return hybrid_future
+
+def _prepare_hybrid(highways, table: _NodeTable, ways: List[Dict[str, Any]], abandoned: threading.Event):
+    """
+    Background half of navigation(): build the hybrid graph from the highway fetch result.
+    Returns (graph, edge_types, locator), or None when there are no highway connectors or
+    the request no longer needs the hybrid route.
+    """
+    if highways is None or abandoned.is_set():
+        return None
+    highway_nodes, highway_ways = highways
+    if not highway_ways:
+        return None
+
+    # Merge pedestrian and highway nodes; pedestrian rows (and so ways' 'idx') stay valid
+    all_table = _extend_table(table, highway_nodes)
+    index = all_table.index
+    highway_ways = [{**way, 'idx': [index[nid] for nid in way['nodes']]} for way in highway_ways]
+
+    # Build hybrid graph with both pedestrian paths and highways
+    # Highways get higher weight (penalty) to prefer pedestrian paths
+    hybrid_graph, hybrid_edge_types = _build_hybrid_graph(
+        all_table, ways, highway_ways, 
+        pedestrian_weight=1.0, highway_weight=3.0  # Highways cost 3x more
+    )
+    return hybrid_graph, hybrid_edge_types, _node_locator(hybrid_graph)
 
 # ---- API: Crowd Estimation/Density ----
 @app.route('/api/crowd', methods=['GET'])
@@ -283,20 +609,14 @@ def crowd():
 @app.route('/api/facilities/<station>', methods=['GET'])
 def facilities(station: str):
     """Return facilities for a station from cache; refresh from Overpass if requested."""
-    from osm_facilities import get_or_refresh_facilities
+    from osm_facilities import get_or_refresh_facilities_bytes
 
     station_key = station.strip().lower()
     refresh = request.args.get('refresh', '0') == '1'
 
     try:
-        data = get_or_refresh_facilities(station_key, force_refresh=refresh)
-        return jsonify({
-            'status': 'success',
-            'station': station_key,
-            'count': len(data.get('facilities', [])),
-            'updated_at': data.get('updated_at'),
-            'facilities': data.get('facilities', [])
-        })
+        # Pre-encoded {'status': 'success', station, updated_at, count, facilities[, stale, stale_reason]}
+        return Response(get_or_refresh_facilities_bytes(station_key, force_refresh=refresh), mimetype='application/json')
     except Exception as exc:
         return jsonify({'status': 'error', 'message': str(exc)}), 500
 
@@ -311,10 +631,12 @@ def paths_catalog():
       - radius_m: meters (default 600) used with center
       - bbox: "south,west,north,east" (optional, overrides center+radius)
       - include_pins: "1" to include basic facilities pins for demo (default 1)
+      - compact: "1" to return coords as [lat, lng] pairs instead of {lat, lng} objects
     """
     center_str = request.args.get('center')
     bbox_str = request.args.get('bbox')
     include_pins = request.args.get('include_pins', '1') == '1'
+    compact = request.args.get('compact', '0') == '1'
     radius_m = float(request.args.get('radius_m', '600'))
 
     try:
@@ -326,18 +648,33 @@ def paths_catalog():
         else:
             return jsonify({'status': 'error', 'message': 'Provide bbox=s,w,n,e or center=lat,lng'}), 400
 
-        data = _fetch_pedestrian_catalog(south, west, north, east)
+        data = _fetch_pedestrian_catalog(south, west, north, east, compact)
         result = {'status': 'success', 'bbox': {'south': south, 'west': west, 'north': north, 'east': east}, **data}
 
         if include_pins:
             # Demo pins: reuse facilities endpoint if available for a couple stations in view (optional)
             result['pins'] = data.get('pins', [])
 
-        return jsonify(result)
+        return _json_response(result)
     except Exception as exc:
         return jsonify({'status': 'error', 'message': str(exc)}), 500
 
-def _fetch_pedestrian_catalog(south: float, west: float, north: float, east: float) -> Dict[str, Any]:
+def _split_elements(data: dict) -> Tuple[Dict[int, Tuple[float, float]], List[Dict[str, Any]]]:
+    """
+    Split an Overpass response into a node_id -> (lat, lng) map and the raw way elements
+    in a single pass. Ways are buffered and resolved by the caller once all nodes are known.
+    """
+    nodes: Dict[int, Tuple[float, float]] = {}
+    ways: List[Dict[str, Any]] = []
+    for el in data.get('elements', []):
+        kind = el.get('type')
+        if kind == 'node':
+            nodes[el['id']] = (el['lat'], el['lon'])
+        elif kind == 'way':
+            ways.append(el)
+    return nodes, ways
+
+def _fetch_pedestrian_catalog(south: float, west: float, north: float, east: float, compact: bool = False) -> Dict[str, Any]:
     """
     Fetch categorized pedestrian ways in bbox:
       - foot_path: highway=footway (excluding steps and crossings/sidewalks subtypes)
@@ -348,26 +685,12 @@ def _fetch_pedestrian_catalog(south: float, west: float, north: float, east: flo
       - pedestrian_street: highway=pedestrian
       - path: highway=path (general paths not caught by informal)
     Returns dict of arrays, each entry: {highway, subtype, coords: [{lat,lng}, ...]}
+    (coords: [[lat, lng], ...] when compact is set)
     """
-    query = f"""
-    [out:json][timeout:180];
-    (
-      way["highway"="footway"]["footway"="sidewalk"]({south},{west},{north},{east});
-      way["highway"="footway"]["footway"="crossing"]({south},{west},{north},{east});
-      way["highway"="steps"]({south},{west},{north},{east});
-      way["highway"="pedestrian"]({south},{west},{north},{east});
-      way["highway"="footway"]({south},{west},{north},{east});
-      way["highway"="path"]({south},{west},{north},{east});
-    );
-    (._;>;);
-    out body;
-    """
+    query = _PEDESTRIAN_CATALOG_QUERY.format_map(_bbox_params(south, west, north, east))
     data = _fetch_overpass_data(query, timeout=180)
 
-    node_map: Dict[int, Tuple[float, float]] = {}
-    for el in data.get('elements', []):
-        if el.get('type') == 'node':
-            node_map[el['id']] = (el['lat'], el['lon'])
+    node_map, raw_ways = _split_elements(data)
 
     categories = {
         'foot_path': [],
@@ -379,22 +702,17 @@ def _fetch_pedestrian_catalog(south: float, west: float, north: float, east: flo
         'path': []
     }
 
-    def to_coords(ids: List[int]):
-        return [{'lat': node_map[i][0], 'lng': node_map[i][1]} for i in ids if i in node_map]
-
-    for el in data.get('elements', []):
-        if el.get('type') != 'way':
-            continue
+    for el in raw_ways:
         tags = el.get('tags', {})
         highway = tags.get('highway', '')
         footway = tags.get('footway', '')
         crossing = tags.get('crossing', '')
         informal = tags.get('informal', '')
         trail_vis = tags.get('trail_visibility', '')
-        node_ids = [nid for nid in el.get('nodes', []) if nid in node_map]
-        if len(node_ids) < 2:
+        lls = [ll for ll in map(node_map.get, el.get('nodes', [])) if ll is not None]
+        coords = lls if compact else [{'lat': ll[0], 'lng': ll[1]} for ll in lls]
+        if len(coords) < 2:
             continue
-        coords = to_coords(node_ids)
         feature = {'highway': highway, 'subtype': footway or crossing or '', 'coords': coords}
 
         if highway == 'steps':
@@ -438,89 +756,46 @@ def _fetch_pedestrian_ways(south: float, west: float, north: float, east: float)
     
     Excludes: marked crossings, other footway subtypes, vehicle roads
     """
-    query = f"""
-    [out:json][timeout:180];
-    (
-      way
-        ["highway"~"^(footway|path|pedestrian|steps)$"]
-        ({south},{west},{north},{east});
-    );
-    (._;>;);
-    out body;
-    """
+    query = _PEDESTRIAN_WAYS_QUERY.format_map(_bbox_params(south, west, north, east))
     data = _fetch_overpass_data(query, timeout=180)
 
-    nodes = {}
+    nodes, raw_ways = _split_elements(data)
+    table = _node_table(nodes)
+    index = table.index
     ways = []
-    for el in data.get('elements', []):
-        if el.get('type') == 'node':
-            nodes[el['id']] = (el['lat'], el['lon'])
-    
-    for el in data.get('elements', []):
-        if el.get('type') != 'way':
-            continue
-            
+    for el in raw_ways:
         tags = el.get('tags', {})
         hw = tags.get('highway', '')
         footway_subtype = tags.get('footway', '')
-        crossing = tags.get('crossing', '')
-        informal = tags.get('informal', '')
-        trail_vis = tags.get('trail_visibility', '')
-        
-        node_ids = el.get('nodes', [])
-        filtered = [nid for nid in node_ids if nid in nodes]
-        if len(filtered) < 2:
-            continue
         
         # Categorize and include only allowed types
-        include_way = False
-        category = None
-        
-        if hw == 'steps':
-            include_way = True
-            category = 'steps'
-        elif hw == 'pedestrian':
-            include_way = True
-            category = 'pedestrian_street'
-        elif hw == 'footway':
-            if footway_subtype == 'sidewalk':
-                include_way = True
-                category = 'sidewalk'
-            elif footway_subtype == 'crossing':
-                # Exclude marked crossings from navigation
-                include_way = False
+        category = _PED_CATEGORY.get(hw)
+        if category is None:
+            if hw == 'footway':
+                if footway_subtype == 'crossing':
+                    # Exclude marked crossings from navigation
+                    continue
+                category = 'sidewalk' if footway_subtype == 'sidewalk' else 'foot_path'
+            elif hw == 'path':
+                informal = tags.get('informal') == 'yes' or tags.get('trail_visibility')
+                category = 'informal_path' if informal else 'path'
             else:
-                # Regular footway (Foot Path)
-                include_way = True
-                category = 'foot_path'
-        elif hw == 'path':
-            if informal == 'yes' or trail_vis:
-                # Informal Path
-                include_way = True
-                category = 'informal_path'
-            else:
-                # Regular Path
-                include_way = True
-                category = 'path'
-        else:
-            # Unknown highway type - skip it
-            include_way = False
+                # Unknown highway type - skip it
+                continue
         
-        if include_way and category:
-            ways.append({
-                'nodes': filtered,
-                'highway': hw,
-                'category': category,
-                'footway_subtype': footway_subtype if hw == 'footway' else None
-            })
-    
-    # If no ways found with strict filtering, try a more lenient approach
-    # (This shouldn't normally happen, but helps with sparse data)
-    if not ways and len([el for el in data.get('elements', []) if el.get('type') == 'way']) > 0:
-        # Log for debugging but don't change behavior - strict filtering is intentional
-        pass
+        # Translate to node-table rows once; all later stages index arrays with these
+        idx = [index[nid] for nid in el.get('nodes', []) if nid in index]
+        if len(idx) < 2:
+            continue
+        
+        ways.append({
+            'idx': idx,
+            'highway': hw,
+            'category': category,
+            'footway_subtype': footway_subtype if hw == 'footway' else None
+        })
     
-    return nodes, ways
+    return table, ways
 
 def _fetch_highways(south: float, west: float, north: float, east: float):
     """
@@ -528,32 +803,16 @@ def _fetch_highways(south: float, west: float, north: float, east: float):
     Includes: residential, service, tertiary, secondary, primary, trunk, motorway
     Excludes: footpaths, paths, pedestrian-only ways
     """
-    query = f"""
-    [out:json][timeout:180];
-    (
-      way
-        ["highway"~"^(residential|service|tertiary|secondary|primary|trunk|motorway|unclassified)$"]
-        ({south},{west},{north},{east});
-    );
-    (._;>;);
-    out body;
-    """
+    query = _HIGHWAYS_QUERY.format_map(_bbox_params(south, west, north, east))
     data = _fetch_overpass_data(query, timeout=180)
 
-    nodes = {}
+    nodes, raw_ways = _split_elements(data)
     ways = []
-    for el in data.get('elements', []):
-        if el.get('type') == 'node':
-            nodes[el['id']] = (el['lat'], el['lon'])
-    
-    for el in data.get('elements', []):
-        if el.get('type') != 'way':
-            continue
-            
+    for el in raw_ways:
         tags = el.get('tags', {})
         hw = tags.get('highway', '')
         
-        if hw in ('residential', 'service', 'tertiary', 'secondary', 'primary', 'trunk', 'motorway', 'unclassified'):
+        if hw in _HIGHWAY_TYPES:
             node_ids = el.get('nodes', [])
             filtered = [nid for nid in node_ids if nid in nodes]
             if len(filtered) >= 2:
@@ -566,7 +825,7 @@ def _fetch_highways(south: float, west: float, north: float, east: float):
     return nodes, ways
 
 def _build_hybrid_graph(
-    nodes: Dict[int, Tuple[float, float]], 
+    table: _NodeTable, 
     pedestrian_ways: List[Dict[str, Any]], 
     highway_ways: List[Dict[str, Any]],
     pedestrian_weight: float = 1.0,
@@ -576,56 +835,97 @@ def _build_hybrid_graph(
     Build a hybrid graph with both pedestrian paths and highways.
     Highways get higher weight (penalty) to prefer pedestrian paths when possible.
     """
-    graph: DefaultDict[int, List[Tuple[int, float]]] = defaultdict(list)
-    edge_types: Dict[frozenset, str] = {}
+    edges = _EdgeList()
+    edge_types: Dict[Tuple[int, int], str] = {}
     
     # Add pedestrian ways with normal weight
-    for way in pedestrian_ways:
-        node_ids = way['nodes']
-        category = way.get('category', way.get('highway', 'path'))
-        for i in range(1, len(node_ids)):
-            u, v = node_ids[i-1], node_ids[i]
-            if u not in nodes or v not in nodes:
-                continue
-            lat1, lon1 = nodes[u]
-            lat2, lon2 = nodes[v]
-            w = _haversine_m(lat1, lon1, lat2, lon2) * pedestrian_weight
-            graph[u].append((v, w))
-            graph[v].append((u, w))
-            ekey = frozenset((u, v))
-            edge_types[ekey] = category
+    categories = [way.get('category', way.get('highway', 'path')) for way in pedestrian_ways]
+    u, v, w, way_of = _ways_edges(table, pedestrian_ways)
+    edges.add(u, v, w * pedestrian_weight)
+    for ekey, i in zip(_edge_keys(u, v), way_of.tolist()):
+        edge_types[ekey] = categories[i]
     
     # Add highway ways with higher weight (penalty)
-    for way in highway_ways:
-        node_ids = way['nodes']
-        for i in range(1, len(node_ids)):
-            u, v = node_ids[i-1], node_ids[i]
-            if u not in nodes or v not in nodes:
-                continue
-            lat1, lon1 = nodes[u]
-            lat2, lon2 = nodes[v]
-            w = _haversine_m(lat1, lon1, lat2, lon2) * highway_weight
-            graph[u].append((v, w))
-            graph[v].append((u, w))
-            ekey = frozenset((u, v))
-            # Only set as highway if not already set (pedestrian paths take priority)
-            if ekey not in edge_types:
-                edge_types[ekey] = 'highway'
+    u, v, w, _ = _ways_edges(table, highway_ways)
+    edges.add(u, v, w * highway_weight)
+    for ekey in _edge_keys(u, v):
+        # Only set as highway if not already set (pedestrian paths take priority)
+        if ekey not in edge_types:
+            edge_types[ekey] = 'highway'
     
-    return graph, edge_types
-
-def _polyline_length(coords: List[Dict[str, float]]) -> float:
-    total = 0.0
-    for i in range(1, len(coords)):
-        a, b = coords[i-1], coords[i]
-        total += _haversine_m(a['lat'], a['lng'], b['lat'], b['lng'])
-    return total
-
-def _build_graph(nodes: Dict[int, Tuple[float, float]], ways: List[Dict[str, Any]]):
-    # Undirected weighted graph: nodeId -> List[(neighborId, weight_m)]
-    # Edge type map: frozenset({u, v}) -> category (foot_path, sidewalk, steps, etc.)
-    graph: DefaultDict[int, List[Tuple[int, float]]] = defaultdict(list)
-    edge_types: Dict[frozenset, str] = {}
+    # Every edge costs at least min(weight) x its length, so scaling the A* heuristic
+    # by that factor keeps it admissible.
+    return edges.to_graph(table, min(pedestrian_weight, highway_weight)), edge_types
+
+def _ways_edges(table: _NodeTable, ways: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return (u_rows, v_rows, weight_m, way_of_edge) arrays for the consecutive node pairs of all
+    ways at once: their 'idx' rows are concatenated and every weight comes from a single
+    vectorized equirectangular call. Edges keep way order; way_of_edge indexes into ways.
+    """
+    lengths = np.fromiter((len(way['idx']) for way in ways), dtype=np.int64, count=len(ways))
+    total = int(lengths.sum())
+    rows = np.fromiter(itertools.chain.from_iterable(way['idx'] for way in ways), dtype=np.int64, count=total)
+    # Drop the pairs that would join the last node of one way to the first node of the next
+    keep = np.ones(max(total - 1, 0), dtype=bool)
+    keep[np.cumsum(lengths)[:-1] - 1] = False
+    a, b = rows[:-1][keep], rows[1:][keep]
+    way_of = np.repeat(np.arange(len(ways)), np.maximum(lengths - 1, 0))
+    return a, b, _equirect_vec(table.lats[a], table.lons[a], table.lats[b], table.lons[b], table.m_per_deg_lon), way_of
+
+def _ekey(u: int, v: int) -> Tuple[int, int]:
+    """Undirected edge key: the node row pair in ascending order."""
+    return (u, v) if u < v else (v, u)
+
+def _edge_keys(u: np.ndarray, v: np.ndarray):
+    """Bulk _ekey over row arrays from _ways_edges."""
+    return zip(np.minimum(u, v).tolist(), np.maximum(u, v).tolist())
+
+class _Graph(NamedTuple):
+    """Undirected routing graph in CSR form; row/column k is row k of the node table."""
+    table: _NodeTable
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+    h_scale: float  # lower bound of weight / straight-line length over all edges
+
+    @property
+    def size(self) -> int:
+        """Number of nodes with at least one edge."""
+        return int(np.count_nonzero(np.diff(self.indptr)))
+
+class _EdgeList:
+    """Accumulates undirected edges as parallel row/col/weight arrays during graph construction."""
+
+    def __init__(self):
+        self.rows: List[np.ndarray] = []
+        self.cols: List[np.ndarray] = []
+        self.data: List[np.ndarray] = []
+
+    def add(self, u: np.ndarray, v: np.ndarray, w: np.ndarray):
+        self.rows.append(u)
+        self.cols.append(v)
+        self.data.append(w)
+
+    def to_graph(self, table: _NodeTable, h_scale: float = 1.0) -> _Graph:
+        """Symmetrize the edges and pack them into CSR arrays over the table rows."""
+        k = len(table.ids)
+        u = np.concatenate(self.rows) if self.rows else np.empty(0, dtype=np.int64)
+        v = np.concatenate(self.cols) if self.cols else np.empty(0, dtype=np.int64)
+        w = np.concatenate(self.data) if self.data else np.empty(0, dtype=np.float64)
+        rows = np.concatenate([u, v])
+        cols = np.concatenate([v, u])
+        data = np.concatenate([w, w])
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(k + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=k), out=indptr[1:])
+        return _Graph(table, indptr, cols[order], data[order], h_scale)
+
+def _build_graph(table: _NodeTable, ways: List[Dict[str, Any]]):
+    # Undirected weighted graph in CSR form over the node table rows (see _Graph)
+    # Edge type map: (min(u, v), max(u, v)) over node rows -> category (foot_path, sidewalk, steps, etc.)
+    edges = _EdgeList()
+    edge_types: Dict[Tuple[int, int], str] = {}
     # Preference order to keep the most restrictive type if duplicates overlap
     # Higher rank = more specific/restrictive path type
     type_rank = {
@@ -637,118 +937,313 @@ def _build_graph(nodes: Dict[int, Tuple[float, float]], ways: List[Dict[str, Any
         'path': 0
     }
 
-    for way in ways:
-        node_ids = way['nodes']
-        category = way.get('category', way.get('highway', 'path'))  # Use category if available
-        for i in range(1, len(node_ids)):
-            u, v = node_ids[i-1], node_ids[i]
-            lat1, lon1 = nodes[u]
-            lat2, lon2 = nodes[v]
-            w = _haversine_m(lat1, lon1, lat2, lon2)
-            graph[u].append((v, w))
-            graph[v].append((u, w))
-            ekey = frozenset((u, v))
-            if ekey in edge_types:
-                # keep the type with higher rank (more specific)
-                prev = edge_types[ekey]
-                if type_rank.get(category, -1) > type_rank.get(prev, -1):
-                    edge_types[ekey] = category
-            else:
-                edge_types[ekey] = category
-    return graph, edge_types
+    categories = [way.get('category', way.get('highway', 'path')) for way in ways]  # Use category if available
+    u, v, w, way_of = _ways_edges(table, ways)
+    edges.add(u, v, w)
+    # Visit edges from the highest rank down (stable, so earlier ways win ties); the first
+    # category written for an edge is then the one to keep and no rank comparison is needed
+    way_rank = np.fromiter((type_rank.get(c, -1) for c in categories), dtype=np.int64, count=len(categories))
+    order = np.argsort(-way_rank[way_of], kind='stable')
+    for ekey, i in zip(_edge_keys(u[order], v[order]), way_of[order].tolist()):
+        edge_types.setdefault(ekey, categories[i])
+    return edges.to_graph(table), edge_types
+
+class _NodeLocator(NamedTuple):
+    """Struct-of-arrays coordinates of the nodes that are part of a routing graph."""
+    rows: np.ndarray  # node-table rows
+    lats: np.ndarray
+    lons: np.ndarray
 
-def _nearest_node(point: Tuple[float, float], nodes: Dict[int, Tuple[float, float]], graph, max_distance_m: float = 200.0) -> Optional[int]:
+def _node_locator(graph: _Graph) -> _NodeLocator:
+    """Restrict the node table to graph members once, so nearest-node queries need no membership checks."""
+    table = graph.table
+    in_graph = np.diff(graph.indptr) > 0
+    # A spatial index (e.g. BallTree) doesn't pay off here: graphs are rebuilt per request and
+    # queried only a few times, and building one costs more than the vectorized scans it saves.
+    return _NodeLocator(np.flatnonzero(in_graph), table.lats[in_graph], table.lons[in_graph])
+
+def _nearest_node(point: Tuple[float, float], locator: _NodeLocator, max_distance_m: float = 200.0) -> Optional[int]:
     """
     Find the nearest graph node to a point.
     
     Args:
         point: (lat, lng) tuple
-        nodes: Dictionary of node_id -> (lat, lng)
-        graph: The routing graph
+        locator: Graph node coordinates from _node_locator
         max_distance_m: Maximum distance in meters to consider (default 200m)
     
     Returns:
-        Node ID if found within max_distance_m, None otherwise
+        Node-table row if found within max_distance_m, None otherwise
     """
-    best_id = None
-    best_d = float('inf')
+    if len(locator.rows) == 0:
+        return None
     plat, plng = point
-    for nid, (lat, lng) in nodes.items():
-        if nid not in graph:
-            continue
-        d = _haversine_m(plat, plng, lat, lng)
-        if d < best_d and d <= max_distance_m:
-            best_d = d
-            best_id = nid
-    return best_id
-
-def _shortest_path(graph, start: int, goal: int) -> List[int]:
-    # Dijkstra
-    dist = {start: 0.0}
-    prev: Dict[int, Optional[int]] = {start: None}
-    heap = [(0.0, start)]
-    visited: Set[int] = set()
+    d = _haversine_vec(plat, plng, locator.lats, locator.lons)
+    idx = int(np.argmin(d))
+    if d[idx] > max_distance_m:
+        return None
+    return int(locator.rows[idx])
+
+# Below this many nodes A* beats SciPy's per-call setup cost
+_SCIPY_MIN_NODES = 256
+
+def _shortest_path(graph: _Graph, src: int, dst: int) -> List[int]:
+    """
+    Shortest path between two node-table rows; returns the row sequence or [] if unreachable.
+    With SciPy: Dijkstra on large graphs, pure-Python A* on small ones. Without SciPy the
+    Numba A* kernel (if installed) takes over, so its JIT cost is only paid in that setup.
+    """
+    if sp_dijkstra is not None:
+        if len(graph.table.ids) >= _SCIPY_MIN_NODES:
+            rows = _dijkstra_scipy(graph, src, dst)
+        else:
+            rows = _astar_py(graph, src, dst)
+    elif _astar_nb is not None:
+        h = _astar_heuristic(graph, dst)
+        prev, found = _astar_nb(graph.indptr, graph.indices, graph.weights, h, src, dst, len(graph.table.ids))
+        rows = _walk_predecessors(prev, src, dst) if found else []
+    else:
+        rows = _astar_py(graph, src, dst)
+    return rows
+
+def _astar_heuristic(graph: _Graph, goal: int) -> np.ndarray:
+    """
+    Admissible A* heuristic for every node: scaled straight-line distance to the goal row,
+    in the same equirectangular metric as the edge weights so it is also consistent.
+    """
+    table = graph.table
+    return _equirect_vec(table.lats, table.lons, table.lats[goal], table.lons[goal], table.m_per_deg_lon) * graph.h_scale
+
+def _dijkstra_scipy(graph: _Graph, src: int, dst: int) -> List[int]:
+    n = len(graph.table.ids)
+    csr = csr_matrix((graph.weights, graph.indices, graph.indptr), shape=(n, n))
+    dist, pred = sp_dijkstra(csr, directed=True, indices=src, return_predecessors=True)
+    if not np.isfinite(dist[dst]):
+        return []
+    return _walk_predecessors(pred, src, dst)
+
+def _walk_predecessors(pred, src: int, dst: int) -> List[int]:
+    path = [dst]
+    cur = dst
+    while cur != src:
+        cur = int(pred[cur])
+        path.append(cur)
+    path.reverse()
+    return path
+
+if njit is not None:
+    @njit(cache=True)
+    def _astar_nb(indptr, indices, weights, h, src, dst, n):
+        """
+        A* over CSR arrays with an array-backed binary min-heap (lazy deletion), keyed
+        by g + h. h must be consistent. Returns (predecessor array, whether dst was reached).
+        """
+        dist = np.full(n, np.inf)
+        prev = np.full(n, -1, dtype=np.int64)
+        done = np.zeros(n, dtype=np.bool_)
+        # Each directed edge is relaxed at most once, which bounds the number of pushes
+        heap_key = np.empty(indices.shape[0] + 1, dtype=np.float64)
+        heap_val = np.empty(indices.shape[0] + 1, dtype=np.int64)
+        dist[src] = 0.0
+        heap_key[0] = h[src]
+        heap_val[0] = src
+        size = 1
+        while size > 0:
+            u = heap_val[0]
+            size -= 1
+            if size > 0:
+                # Move the last entry to the root and sift it down
+                last_key = heap_key[size]
+                last_val = heap_val[size]
+                i = 0
+                while True:
+                    c = 2 * i + 1
+                    if c >= size:
+                        break
+                    if c + 1 < size and heap_key[c + 1] < heap_key[c]:
+                        c += 1
+                    if heap_key[c] >= last_key:
+                        break
+                    heap_key[i] = heap_key[c]
+                    heap_val[i] = heap_val[c]
+                    i = c
+                heap_key[i] = last_key
+                heap_val[i] = last_val
+            if done[u]:
+                continue
+            done[u] = True
+            if u == dst:
+                break
+            d = dist[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    prev[v] = u
+                    f = nd + h[v]
+                    # Sift the new entry up
+                    i = size
+                    size += 1
+                    while i > 0:
+                        p = (i - 1) // 2
+                        if heap_key[p] <= f:
+                            break
+                        heap_key[i] = heap_key[p]
+                        heap_val[i] = heap_val[p]
+                        i = p
+                    heap_key[i] = f
+                    heap_val[i] = v
+        return prev, done[dst]
+else:
+    _astar_nb = None
+
+class _IndexedHeap:
+    """
+    4-ary min-heap of dense node indices with decrease-key.
+    Each node is queued at most once; key[v] holds its best known priority.
+    """
+    __slots__ = ('heap', 'key', 'pos')
+
+    def __init__(self, n: int):
+        self.heap: List[int] = []
+        self.key: List[float] = [math.inf] * n
+        self.pos: List[int] = [-1] * n  # position in heap, -1 if not queued
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def push_or_decrease(self, v: int, k: float) -> bool:
+        """Queue v with priority k, or lower its priority. Returns False if k is no improvement."""
+        if k >= self.key[v]:
+            return False
+        self.key[v] = k
+        i = self.pos[v]
+        if i < 0:
+            self.heap.append(v)
+            i = len(self.heap) - 1
+        self._sift_up(i, v)
+        return True
+
+    def pop(self) -> int:
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        self.pos[top] = -1
+        if heap:
+            self._sift_down(0, last)
+        return top
+
+    def _sift_up(self, i: int, v: int):
+        heap, key, pos = self.heap, self.key, self.pos
+        k = key[v]
+        while i > 0:
+            p = (i - 1) >> 2
+            parent = heap[p]
+            if key[parent] <= k:
+                break
+            heap[i] = parent
+            pos[parent] = i
+            i = p
+        heap[i] = v
+        pos[v] = i
+
+    def _sift_down(self, i: int, v: int):
+        heap, key, pos = self.heap, self.key, self.pos
+        k = key[v]
+        n = len(heap)
+        while True:
+            first = 4 * i + 1
+            if first >= n:
+                break
+            best = first
+            best_k = key[heap[first]]
+            for c in range(first + 1, min(first + 4, n)):
+                ck = key[heap[c]]
+                if ck < best_k:
+                    best, best_k = c, ck
+            if best_k >= k:
+                break
+            child = heap[best]
+            heap[i] = child
+            pos[child] = i
+            i = best
+        heap[i] = v
+        pos[v] = i
+
+def _astar_py(graph: _Graph, start: int, goal: int) -> List[int]:
+    """A* with a straight-line heuristic; expands far fewer nodes than plain Dijkstra."""
+    indptr = graph.indptr.tolist()
+    indices = graph.indices.tolist()
+    weights = graph.weights.tolist()
+    h = _astar_heuristic(graph, goal).tolist()
+    n = len(indptr) - 1
+    # Flat per-node state indexed by dense row; plain lists beat NumPy arrays
+    # here because every access is a single scalar from Python code.
+    heap = _IndexedHeap(n)  # keyed by f = g + h
+    dist = [math.inf] * n   # g: true distance from start
+    prev = [-1] * n
+    dist[start] = 0.0
+    heap.push_or_decrease(start, h[start])
 
     while heap:
-        d, u = heapq.heappop(heap)
-        if u in visited:
-            continue
-        visited.add(u)
+        u = heap.pop()
         if u == goal:
             break
-        for v, w in graph.get(u, []):
-            nd = d + w
-            if nd < dist.get(v, float('inf')):
+        d = dist[u]
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            nd = d + weights[k]
+            if nd < dist[v]:
                 dist[v] = nd
                 prev[v] = u
-                heapq.heappush(heap, (nd, v))
+                heap.push_or_decrease(v, nd + h[v])
 
-    if goal not in prev and goal != start:
+    if math.isinf(dist[goal]):
         return []
+    return _walk_predecessors(prev, start, goal)
 
-    # Reconstruct
-    path = []
-    cur = goal
-    path.append(cur)
-    while cur in prev and prev[cur] is not None:
-        cur = prev[cur]
-        path.append(cur)
-    if path[-1] != start:
-        # No path
-        return []
-    path.reverse()
-    return path
+def _path_profile(node_path: List[int], table: _NodeTable, edge_types: Dict[Tuple[int, int], str]):
+    """
+    Coordinates and per-segment categories of a routed node path (node-table rows), looked up
+    once and shared by the route polyline, the colored segments and the distance statistics.
+    Returns (lats, lngs, categories) with len(categories) == len(node_path) - 1.
+    """
+    lats = table.lats[node_path]
+    lngs = table.lons[node_path]
+    categories = [edge_types.get(_ekey(u, v), 'foot_path') for u, v in zip(node_path, node_path[1:])]  # Default to foot_path
+    return lats, lngs, categories
 
-def _segments_with_types(node_path: List[int], nodes: Dict[int, Tuple[float, float]], edge_types: Dict[frozenset, str]):
+def _segments_with_types(lats: List[float], lngs: List[float], categories: List[str]):
     segments = []
-    for i in range(1, len(node_path)):
-        u = node_path[i-1]
-        v = node_path[i]
-        ekey = frozenset((u, v))
-        category = edge_types.get(ekey, 'foot_path')  # Default to foot_path
-        
+    for i, category in enumerate(categories):
         # Handle highway segments
         if category == 'highway':
             highway_type = 'highway'  # Could be enhanced to get specific highway type
         else:
             highway_type = category
         
-        lat1, lng1 = nodes[u]
-        lat2, lng2 = nodes[v]
         segments.append({
-            'from': {'lat': lat1, 'lng': lng1},
-            'to': {'lat': lat2, 'lng': lng2},
+            'from': {'lat': lats[i], 'lng': lngs[i]},
+            'to': {'lat': lats[i + 1], 'lng': lngs[i + 1]},
             'category': category,  # Use category name (foot_path, sidewalk, steps, highway, etc.)
             'highway': highway_type,  # Keep for backward compatibility
             'is_highway': category == 'highway'  # Flag for easy filtering
         })
     return segments
 
-def _network_geometries(nodes: Dict[int, Tuple[float, float]], ways: List[Dict[str, Any]]):
+def _network_geometries(table: _NodeTable, ways: List[Dict[str, Any]], compact: bool = False):
     # Return polylines per way with its category for background rendering
+    # compact: coords as an (n, 2) array of [lat, lng] rows instead of {lat, lng} dicts
+    if compact:
+        latlng = np.column_stack((table.lats, table.lons))
+    else:
+        lats, lngs = table.lats.tolist(), table.lons.tolist()
     features = []
     for way in ways:
-        coords = [{'lat': nodes[nid][0], 'lng': nodes[nid][1]} for nid in way['nodes'] if nid in nodes]
+        if compact:
+            coords = latlng[way['idx']]
+        else:
+            coords = [{'lat': lats[i], 'lng': lngs[i]} for i in way['idx']]
         if len(coords) >= 2:
             category = way.get('category', way.get('highway', 'path'))
             features.append({
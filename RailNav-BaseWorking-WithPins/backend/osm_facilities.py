@@ -1,15 +1,53 @@
-import json
+import logging
+import math
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime
 import time
+from collections import defaultdict
 import hashlib
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import orjson
 import requests
+import zstandard
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
 
+try:
+    import ijson
+except ImportError:  # ijson is optional; responses are then parsed whole with resp.json()
+    ijson = None
+
+logger = logging.getLogger(__name__)
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Stale-while-revalidate: cache files older than the soft TTL are still served but refreshed
+# in the background; past the hard TTL (or when missing) the request waits for Overpass.
+SOFT_TTL_SECONDS = int(os.getenv('FACILITIES_CACHE_SOFT_TTL', 3600))
+HARD_TTL_SECONDS = int(os.getenv('FACILITIES_CACHE_TTL', 86400))
+
+# Parsed cache files: station_key -> (file mtime, payload, response bytes), the bytes being
+# the /api/facilities body pre-encoded once per payload. An entry is only used while its
+# mtime matches the file on disk, so a refresh by any writer invalidates it.
+_MEM_CACHE: Dict[str, Tuple[float, Dict[str, Any], bytes]] = {}
+_MEM_CACHE_LOCK = threading.Lock()
+# Single-flight per station: concurrent requests for a stale station make one Overpass
+# query, while different stations still refresh in parallel
+_REFRESH_LOCKS: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+# Outcome of a station's last failed refresh: (failed_at, stale entry served or the error
+# raised). For _REFRESH_RETRY_S afterwards, requests that would refresh get that outcome
+# instead of each queuing behind the lock for their own failing Overpass query.
+_FAILED_REFRESHES: Dict[str, Tuple[float, Any]] = {}
+_REFRESH_RETRY_S = 60.0
+# Background revalidations; _REVALIDATING holds the stations with one queued or running
+_BG_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='facilities-refresh')
+_REVALIDATING: set = set()
+_REVALIDATING_LOCK = threading.Lock()
+
 # Overpass API endpoints (fallback if one is slow/down)
 OVERPASS_URLS = [
     "https://overpass-api.de/api/interpreter",
@@ -19,6 +57,62 @@ OVERPASS_URLS = [
 
 _OVERPASS_CACHE: Dict[str, tuple[float, Dict[str, Any]]] = {}
 _OVERPASS_CACHE_TTL_S = 3600.0  # 1 hour (facilities change slowly)
+# Start the next endpoint if the current ones have not answered within this many seconds
+_HEDGE_DELAY_S = 2.0
+# (connect, read) timeouts: an unreachable host fails in ~3 s instead of a full read timeout;
+# the query's server-side [timeout:] stays below the read timeout so Overpass gives up first
+_REQUEST_TIMEOUT_S = (3.05, 45.0)
+_QUERY_TIMEOUT_S = 40
+# Shared by every _overpass_query call (and so every station) instead of a pool per call;
+# sized for two concurrent station refreshes hedging across all endpoints
+_QUERY_POOL = ThreadPoolExecutor(max_workers=2 * len(OVERPASS_URLS), thread_name_prefix='overpass-facilities')
+# Keep-alive session shared by all pool workers, so retries and later refreshes reuse the
+# TCP/TLS connection to each endpoint. Retries are ours (_post_with_backoff), not urllib3's.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+_SESSION.headers.update({'User-Agent': 'RailNav/1.0'})
+
+
+class _Breaker:
+    """
+    Circuit breaker for one Overpass endpoint. CLOSED until fail_threshold consecutive
+    failures, then OPEN (requests skipped) for cooldown_s, then HALF_OPEN: a single probe
+    request is let through and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, fail_threshold: int = 5, cooldown_s: float = 60.0):
+        self.fail_threshold = fail_threshold
+        self.cooldown_s = cooldown_s
+        self.state = self.CLOSED
+        self.fail_count = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.cooldown_s:
+                self.state = self.HALF_OPEN  # this caller is the probe
+                return True
+            return False
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.fail_count = 0
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.fail_count += 1
+            if self.state == self.HALF_OPEN or self.fail_count >= self.fail_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+
+_breakers: Dict[str, _Breaker] = {url: _Breaker() for url in OVERPASS_URLS}
 
 
 STATIONS = {
@@ -63,133 +157,370 @@ TAG_MAPPINGS = {
     'entrance': ('Entrance', ['entrance=yes', 'railway=station_entrance']),
 }
 
+# (tag key, tag value) -> (priority, readable type), flattened from TAG_MAPPINGS once.
+# Priority is the mapping's position, so an element matching several mappings still gets
+# the first one in TAG_MAPPINGS order.
+def _build_tag_index() -> Dict[Tuple[str, str], Tuple[int, str]]:
+    index: Dict[Tuple[str, str], Tuple[int, str]] = {}
+    for priority, (readable, patterns) in enumerate(TAG_MAPPINGS.values()):
+        for pat in patterns:
+            k, v = pat.split('=')
+            index.setdefault((k, v), (priority, readable))
+    return index
 
-def _overpass_query(center_lat: float, center_lng: float, radius_m: int) -> Dict[str, Any]:
-    # Build a combined Overpass QL query for relevant tags around center within radius
-    around = f"around:{radius_m},{center_lat},{center_lng}"
-    selectors = [
-        'amenity=toilets','amenity=atm','amenity=bank','amenity=drinking_water',
-        'amenity=fast_food','amenity=restaurant','amenity=cafe','amenity=food_court',
-        'amenity=waiting_room','amenity=bench','amenity=bicycle_parking','amenity=parking',
-        'amenity=police','amenity=clinic','amenity=hospital','amenity=pharmacy',
-        'emergency=first_aid_kit','highway=elevator','tourism=information','amenity=information',
-        'railway=ticket_validator','amenity=ticket_office','entrance=yes','railway=station_entrance'
-    ]
 
+_TAG_INDEX = _build_tag_index()
+
+# Tags whose value names the type of an unmapped element, in order of preference
+_FALLBACK_KEYS = ('amenity', 'railway', 'tourism')
+
+# Every "k=v" pattern in TAG_MAPPINGS (deduplicated, in mapping order), so the query can't
+# drift from the classifier
+_SELECTORS = list(dict.fromkeys(pat for _, patterns in TAG_MAPPINGS.values() for pat in patterns))
+
+
+def _build_query_template() -> str:
     parts = []
-    for sel in selectors:
+    for sel in _SELECTORS:
         k, v = sel.split('=')
-        parts.append(f"node[\"{k}\"=\"{v}\"]({around});")
-        parts.append(f"way[\"{k}\"=\"{v}\"]({around});")
-        parts.append(f"relation[\"{k}\"=\"{v}\"]({around});")
-
-    q = f"""
-    [out:json][timeout:180];
+        # nwr = node, way and relation in one statement (ways/relations get a center below)
+        parts.append(f"nwr[\"{k}\"=\"{v}\"]({{around}});")
+    return f"""
+    [out:json][timeout:{_QUERY_TIMEOUT_S}];
     (
       {''.join(parts)}
     );
     out center tags;
     """
 
+
+# Combined Overpass QL query for all selectors; only the {around} filter varies per station
+_QUERY_TEMPLATE = _build_query_template()
+
+
+def _overpass_query(center_lat: float, center_lng: float, radius_m: int) -> Dict[str, Any]:
+    # Combined Overpass QL query for relevant tags around center within radius
+    around = f"around:{radius_m},{center_lat},{center_lng}"
+    q = _QUERY_TEMPLATE.format(around=around)
+
     cache_key = hashlib.sha1(q.encode('utf-8')).hexdigest()
     now = time.time()
     cached = _OVERPASS_CACHE.get(cache_key)
     if cached and (now - cached[0]) < _OVERPASS_CACHE_TTL_S:
         return cached[1]
 
+    # Hedged requests: query the first endpoint, then bring in the next one whenever the
+    # in-flight ones fail or stay silent for _HEDGE_DELAY_S; the first success wins.
     last_error: Exception | None = None
-    for url in OVERPASS_URLS:
-        for attempt in range(2):
-            try:
-                resp = requests.post(url, data={'data': q}, timeout=180)
-                resp.raise_for_status()
-                data = resp.json()
+    remaining = list(OVERPASS_URLS)
+    pending = set()
+    try:
+        while remaining or pending:
+            if remaining:
+                pending.add(_QUERY_POOL.submit(_post_through_breaker, remaining.pop(0), q))
+            done, pending = wait(pending, timeout=_HEDGE_DELAY_S if remaining else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    data = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
                 _OVERPASS_CACHE[cache_key] = (time.time(), data)
                 return data
-            except requests.exceptions.Timeout as e:
-                last_error = e
-                time.sleep(0.4 * (attempt + 1))
-                continue
-            except Exception as e:
-                last_error = e
-                break
+    finally:
+        # Don't wait for the losing requests; they finish (and are discarded) in the background
+        for future in pending:
+            future.cancel()
 
     raise RuntimeError(f"Overpass facilities query failed. Last error: {last_error}")
 
 
-def _classify_and_name(features: List[Dict[str, Any]], station_prefix: str) -> List[Dict[str, Any]]:
+def _post_through_breaker(url: str, q: str) -> Dict[str, Any]:
+    # Consulted in the pool rather than at submit time, so a HALF_OPEN probe is only taken by a
+    # request that really runs, and losing hedged requests still report their outcome
+    breaker = _breakers[url]
+    if not breaker.allow():
+        # Fails immediately, so the hedge moves straight on to the next endpoint
+        raise RuntimeError(f"Circuit open for {url} after repeated failures")
+    try:
+        data = _post_with_backoff(url, q)
+    except Exception:
+        breaker.on_failure()
+        raise
+    breaker.on_success()
+    return data
+
+
+def _post_with_backoff(url: str, q: str, attempts: int = 3, base: float = 0.5, cap: float = 8.0) -> Dict[str, Any]:
+    # POST the query to one endpoint. Timeouts, 429 and 5xx are retried after an
+    # exponential backoff with full jitter (or the server's Retry-After); any other
+    # error, including an incomplete (remark) result, is permanent for this endpoint and
+    # raised straight away.
+    for attempt in range(attempts):
+        retry_after = None
+        try:
+            with _SESSION.post(url, data={'data': q}, timeout=_REQUEST_TIMEOUT_S, stream=ijson is not None) as resp:
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    retry_after = _retry_after_s(resp)
+                resp.raise_for_status()
+                return _read_elements(resp)
+        except requests.exceptions.Timeout:
+            if attempt == attempts - 1:
+                raise
+        except requests.exceptions.HTTPError:
+            if attempt == attempts - 1 or retry_after is None:
+                raise
+        delay = retry_after if retry_after else random.uniform(0, min(cap, base * (2 ** attempt)))
+        time.sleep(delay)
+
+
+class _OverpassIncompleteError(Exception):
+    """Overpass answered 200 but flagged the result as incomplete with a 'remark'."""
+
+
+def _read_elements(resp: requests.Response) -> Dict[str, Any]:
+    # {'elements': [...]} of an Overpass response. With ijson the top-level members are parsed
+    # as the body streams in, so the raw bytes and the parsed document are never both held in
+    # full. A 'remark' (written after 'elements') reports a server-side runtime error such as
+    # a timeout or out of memory: the elements are then partial, so the result is rejected.
+    if ijson is None:
+        data = resp.json()
+    else:
+        resp.raw.decode_content = True  # let urllib3 undo gzip/deflate
+        try:
+            data = dict(ijson.kvitems(resp.raw, '', use_float=True))
+        except ReadTimeoutError as e:
+            # Reading resp.raw bypasses requests' exception wrapping; keep timeouts retryable
+            raise requests.exceptions.Timeout(str(e)) from e
+    if data.get('remark'):
+        raise _OverpassIncompleteError(f"Incomplete Overpass result from {resp.url}: {data['remark']}")
+    return {'elements': data.get('elements', [])}
+
+
+def _retry_after_s(resp: requests.Response) -> float:
+    # Seconds requested by a Retry-After header, clamped to [0, 60]; 0.0 if absent, not in
+    # seconds or not finite (time.sleep rejects negative and NaN delays)
+    try:
+        delay = float(resp.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+    if not math.isfinite(delay):
+        return 0.0
+    return min(max(delay, 0.0), 60.0)
+
+
+_EARTH_RADIUS_M = 6371000.0
+
+
+def _classify_and_name(features: Iterable[Dict[str, Any]], station_prefix: str,
+                       center: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    # With a station center, each facility also carries its coordinates in radians and its
+    # haversine distance to the center, computed once per refresh instead of per request.
     counters: Dict[str, int] = {}
     results: List[Dict[str, Any]] = []
+    # Hot loop over every Overpass element: lookups bound to locals, fallback type names
+    # ("fast food" -> "Fast_Food") formatted once per distinct tag value
+    tag_index_get = _TAG_INDEX.get
+    fallback_names: Dict[str, str] = {}
 
-    def next_index(key: str) -> int:
-        counters[key] = counters.get(key, 0) + 1
-        return counters[key]
+    if center is not None:
+        c_lat, c_lng = math.radians(center['lat']), math.radians(center['lng'])
+        cos_c_lat = math.cos(c_lat)
 
     for el in features:
-        tags = el.get('tags', {}) or {}
-        lat = el.get('lat') or el.get('center', {}).get('lat')
-        lon = el.get('lon') or el.get('center', {}).get('lon')
+        tags = el.get('tags') or {}
+        lat = el.get('lat')
+        lon = el.get('lon')
+        if not lat or not lon:
+            # ways/relations carry their position in 'center'
+            c = el.get('center', {})
+            lat = lat or c.get('lat')
+            lon = lon or c.get('lon')
         if lat is None or lon is None:
             continue
 
-        classified_type = None
-
-        # try mappings
-        for key, (readable, patterns) in TAG_MAPPINGS.items():
-            for pat in patterns:
-                k, v = pat.split('=')
-                if tags.get(k) == v:
-                    classified_type = readable
+        # try mappings: one index lookup per tag, best (lowest) priority wins
+        best = None
+        for item in tags.items():
+            hit = tag_index_get(item)
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best = hit
+
+        if best is not None:
+            classified_type = best[1]
+        else:
+            # fallback
+            classified_type = 'Facility'
+            for key in _FALLBACK_KEYS:
+                if key in tags:
+                    value = tags[key]
+                    classified_type = fallback_names.get(value)
+                    if classified_type is None:
+                        classified_type = fallback_names[value] = value.title().replace(' ', '_')
                     break
-            if classified_type:
-                break
-
-        # fallback
-        if not classified_type:
-            if 'amenity' in tags:
-                classified_type = tags['amenity'].title().replace(' ', '_')
-            elif 'railway' in tags:
-                classified_type = tags['railway'].title().replace(' ', '_')
-            elif 'tourism' in tags:
-                classified_type = tags['tourism'].title().replace(' ', '_')
-            else:
-                classified_type = 'Facility'
-
-        idx = next_index(classified_type)
-        name = tags.get('name')
-        human_name = f"{station_prefix}_{classified_type}_{idx}"
-
-        results.append({
+
+        idx = counters[classified_type] = counters.get(classified_type, 0) + 1
+
+        facility = {
             'id': el.get('id'),
-            'name': human_name,
+            'name': f"{station_prefix}_{classified_type}_{idx}",
             'type': classified_type,
             'lat': float(lat),
             'lng': float(lon),
-            'raw_name': name,
+            'raw_name': tags.get('name'),
             'tags': tags
-        })
+        }
+        if center is not None:
+            lat_rad, lng_rad = math.radians(lat), math.radians(lon)
+            a = (math.sin((lat_rad - c_lat) / 2) ** 2
+                 + cos_c_lat * math.cos(lat_rad) * math.sin((lng_rad - c_lng) / 2) ** 2)
+            facility['lat_rad'] = lat_rad
+            facility['lng_rad'] = lng_rad
+            facility['d_to_center_m'] = 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(a))
+        results.append(facility)
 
     return results
 
 
+# zstd level for cache files: fast to write, and still several times smaller than the JSON
+_CACHE_ZSTD_LEVEL = 3
+
+
 def _cache_path(station_key: str) -> str:
+    return os.path.join(DATA_DIR, f'{station_key}_facilities.json.zst')
+
+
+def _legacy_cache_path(station_key: str) -> str:
+    # Plain-JSON cache from before compression (also the committed seed data); read until the
+    # station's first refresh writes the .zst file
     return os.path.join(DATA_DIR, f'{station_key}_facilities.json')
 
 
+def _response_bytes(payload: Dict[str, Any]) -> bytes:
+    # JSON body served by /api/facilities for this payload
+    return orjson.dumps({'status': 'success', **payload})
+
+
+def _read_cache(station_key: str, cache_file: str) -> Optional[Tuple[float, Dict[str, Any], bytes]]:
+    # (mtime, payload, bytes) of the station's cache file, parsed at most once per file version
+    compressed = True
+    try:
+        mtime = os.path.getmtime(cache_file)
+    except OSError:
+        cache_file = _legacy_cache_path(station_key)
+        compressed = False
+        try:
+            mtime = os.path.getmtime(cache_file)
+        except OSError:
+            return None
+    with _MEM_CACHE_LOCK:
+        entry = _MEM_CACHE.get(station_key)
+    if entry and entry[0] == mtime:
+        return entry
+    with open(cache_file, 'rb') as f:
+        raw = f.read()
+    payload = orjson.loads(zstandard.decompress(raw) if compressed else raw)
+    entry = (mtime, payload, _response_bytes(payload))
+    with _MEM_CACHE_LOCK:
+        _MEM_CACHE[station_key] = entry
+    return entry
+
+
+def _read_fresh(station_key: str, cache_file: str) -> Optional[Tuple[float, Dict[str, Any], bytes]]:
+    # Cache entry if it is within the hard TTL, scheduling a background refresh once it
+    # is past the soft TTL; None if the caller has to refresh synchronously
+    entry = _read_cache(station_key, cache_file)
+    if entry is None:
+        return None
+    age = time.time() - entry[0]
+    if age >= HARD_TTL_SECONDS:
+        return None
+    if age >= SOFT_TTL_SECONDS:
+        _schedule_revalidate(station_key, cache_file)
+    return entry
+
+
+def _schedule_revalidate(station_key: str, cache_file: str) -> None:
+    with _REVALIDATING_LOCK:
+        if station_key in _REVALIDATING:
+            return
+        _REVALIDATING.add(station_key)
+    _BG_POOL.submit(_revalidate, station_key, cache_file)
+
+
+def _revalidate(station_key: str, cache_file: str) -> None:
+    try:
+        with _REFRESH_LOCKS[station_key]:
+            # Skip if a foreground refresh already renewed the file
+            entry = _read_cache(station_key, cache_file)
+            if entry and time.time() - entry[0] < SOFT_TTL_SECONDS:
+                return
+            _refresh(station_key, cache_file)
+    finally:
+        with _REVALIDATING_LOCK:
+            _REVALIDATING.discard(station_key)
+
+
 def get_or_refresh_facilities(station_key: str, force_refresh: bool = False) -> Dict[str, Any]:
+    return _get_entry(station_key, force_refresh)[1]
+
+
+def get_or_refresh_facilities_bytes(station_key: str, force_refresh: bool = False) -> bytes:
+    # Same lookup as get_or_refresh_facilities, returning the ready-to-send /api/facilities
+    # JSON body ({'status': 'success', **payload}) so the route skips encoding
+    return _get_entry(station_key, force_refresh)[2]
+
+
+def _get_entry(station_key: str, force_refresh: bool) -> Tuple[float, Dict[str, Any], bytes]:
     if station_key not in STATIONS:
         raise ValueError(f"Unsupported station '{station_key}'. Supported: {', '.join(STATIONS.keys())}")
 
     cache_file = _cache_path(station_key)
 
-    if not force_refresh and os.path.exists(cache_file):
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-
+    if not force_refresh:
+        entry = _read_fresh(station_key, cache_file) or _recent_failure(station_key)
+        if entry is not None:
+            return entry
+
+    with _REFRESH_LOCKS[station_key]:
+        # Another request may have refreshed the station (or failed to) while this one
+        # waited for the lock
+        if not force_refresh:
+            entry = _read_fresh(station_key, cache_file) or _recent_failure(station_key)
+            if entry is not None:
+                return entry
+        return _refresh(station_key, cache_file)
+
+
+def _recent_failure(station_key: str) -> Optional[Tuple[float, Dict[str, Any], bytes]]:
+    # Stale entry from a refresh that failed within _REFRESH_RETRY_S (re-raising its error if
+    # there was no cache to fall back on); None once a new attempt is due
+    failure = _FAILED_REFRESHES.get(station_key)
+    if failure is None or time.time() - failure[0] >= _REFRESH_RETRY_S:
+        return None
+    if isinstance(failure[1], Exception):
+        raise failure[1]
+    return failure[1]
+
+
+def _refresh(station_key: str, cache_file: str) -> Tuple[float, Dict[str, Any], bytes]:
     cfg = STATIONS[station_key]
-    raw = _overpass_query(cfg['center']['lat'], cfg['center']['lng'], cfg['radius_m'])
+    try:
+        raw = _overpass_query(cfg['center']['lat'], cfg['center']['lng'], cfg['radius_m'])
+    except Exception as e:
+        stale = _read_cache(station_key, cache_file)
+        if stale is None:
+            _FAILED_REFRESHES[station_key] = (time.time(), e)
+            raise
+        # Overpass unavailable: last-known-good facilities beat none
+        logger.warning("Facilities refresh for %s failed, serving cache from %s: %s",
+                       station_key, datetime.utcfromtimestamp(stale[0]).isoformat() + 'Z', e)
+        payload = {**stale[1], 'stale': True, 'stale_reason': str(e)}
+        entry = (stale[0], payload, _response_bytes(payload))
+        _FAILED_REFRESHES[station_key] = (time.time(), entry)
+        return entry
     elements = raw.get('elements', [])
-    facilities = _classify_and_name(elements, cfg['prefix'])
+    facilities = _classify_and_name(elements, cfg['prefix'], cfg['center'])
 
     payload = {
         'station': station_key,
@@ -198,9 +529,21 @@ def get_or_refresh_facilities(station_key: str, force_refresh: bool = False) ->
         'facilities': facilities
     }
 
-    with open(cache_file, 'w', encoding='utf-8') as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    # Write to a temp file and swap it in, so readers never see a half-written cache
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(zstandard.compress(orjson.dumps(payload), _CACHE_ZSTD_LEVEL))
+    os.replace(tmp_file, cache_file)
+    entry = (os.path.getmtime(cache_file), payload, _response_bytes(payload))
+    with _MEM_CACHE_LOCK:
+        _MEM_CACHE[station_key] = entry
+    _FAILED_REFRESHES.pop(station_key, None)
 
-    return payload
+    return entry
 
 
+def refresh_all(force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    # Load (or refresh) every station concurrently; warm-up costs the slowest station rather than the sum.
+    # Runs on its own executor: the station tasks block on _QUERY_POOL futures and must not occupy it.
+    with ThreadPoolExecutor(max_workers=min(8, len(STATIONS))) as ex:
+        return dict(zip(STATIONS, ex.map(lambda key: get_or_refresh_facilities(key, force_refresh), STATIONS)))